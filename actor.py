@@ -1,7 +1,7 @@
 """haakon8855"""
 
 import random
-from collections import defaultdict
+import numpy as np
 
 
 class Actor:
@@ -9,86 +9,137 @@ class Actor:
     Actor class for making actions in a simulated world.
     """
 
-    def __init__(self, lrate, drate, trace_decay):
-        self.policy = defaultdict(lambda: 0)
-        self.state_action_eligibility = defaultdict(lambda: 0)
+    def __init__(self,
+                 num_states,
+                 num_actions,
+                 lrate,
+                 drate,
+                 trace_decay,
+                 dtype=np.float32,
+                 trace_threshold=1e-6,
+                 num_envs=None):
+        # Tables are indexed by [state index, action]. If num_envs is given,
+        # the actor serves a batch of worlds sharing the policy, and the
+        # eligibilities of each world are indexed by [world, state index,
+        # action].
+        self.num_actions = num_actions
+        self.dtype = dtype
+        self.policy = np.zeros((num_states, num_actions), dtype=dtype)
+        eligibility_shape = (num_states, num_actions)
+        if num_envs is not None:
+            eligibility_shape = (num_envs, num_states, num_actions)
+            self._env_indexes = np.arange(num_envs)
+        self.state_action_eligibility = np.zeros(eligibility_shape,
+                                                 dtype=dtype)
+        # Flat view of the eligibilities, indexed by a packed
+        # state-action-pair (see get_state_action_pair).
+        self.flat_state_action_eligibility = (
+            self.state_action_eligibility.reshape(-1))
+        # Preallocated buffer for the policy update
+        self._scratch = np.zeros((num_states, num_actions), dtype=dtype)
         self.lrate = lrate
         self.drate = drate
         self.trace_decay = trace_decay
+        # Factor the eligibilities are multiplied by each step
+        self._decay = dtype(drate * trace_decay)
+        # Eligibilities below the threshold are zeroed by prune_eligibility.
+        # With dense tables this replaces keeping a list of the visited
+        # pairs and dropping each pair once its trace falls below it.
+        self.trace_threshold = trace_threshold
 
-    def initiate_eligibility(self):
+    def initiate_eligibility(self, worlds=None):
         """
-        Initiates the state-action eligibility.
+        Initiates the state-action eligibility, only that of the worlds in
+        the given mask if the actor serves a batch of worlds.
         """
-        self.state_action_eligibility = defaultdict(lambda: 0)
+        if worlds is None:
+            self.state_action_eligibility.fill(0)
+        else:
+            self.state_action_eligibility[worlds] = 0
 
-    def get_state_action_eligibility(self, state_action_pair):
+    def get_state_action_pair(self, state, action):
         """
-        Updates the eligibility for the given state_action_pair.
+        Returns the state-action-pair of a state index and an action packed
+        into one integer.
         """
-        return self.state_action_eligibility[state_action_pair]
+        return state * self.num_actions + action
 
-    def set_state_action_eligibility(self, state_action_pair, value):
+    def replace_trace(self, state_action_pair):
         """
-        Updates the eligibility for the given state_action_pair.
+        Sets the eligibility of the given state_action_pair to 1, i.e. a
+        replacing trace.
         """
-        self.state_action_eligibility[state_action_pair] = value
+        self.flat_state_action_eligibility[state_action_pair] = 1
 
-    def get_state_action_value(self, state_action_pair):
+    def replace_traces(self, states, actions):
         """
-        Returns the value of the state and action pair.
+        Only for a batch of worlds:
+        Sets the eligibility of the given state index and action of each
+        world to 1, i.e. a replacing trace.
         """
-        return self.policy[state_action_pair]
+        self.state_action_eligibility[self._env_indexes, states, actions] = 1
 
-    def set_state_action_value(self, state_action_pair, value):
+    def apply_td_update(self, td_error):
         """
-        Returns the value of the state and action pair.
+        Updates the state action evaluation of every state action pair
+        given the td_error. Pairs not visited in the episode have zero
+        eligibility and are left unchanged.
         """
-        self.policy[state_action_pair] = value
+        np.multiply(self.state_action_eligibility,
+                    self.dtype(self.lrate * td_error),
+                    out=self._scratch)
+        self.policy += self._scratch
 
-    def update_state_action_value(self, state_action_pair, td_error):
-        """
-        Updates the state action evaluation given a state action pair
-        and td_error.
-        """
-        # Calculate the new policy value
-        new_state_action_value = self.get_state_action_value(
-            state_action_pair
-        ) + self.lrate * td_error * self.get_state_action_eligibility(
-            state_action_pair)
-        # Store it in the policy table
-        self.set_state_action_value(state_action_pair, new_state_action_value)
+    def apply_batched_td_update(self, td_errors):
+        """
+        Only for a batch of worlds:
+        Updates the state action evaluation of every state action pair given
+        the td_error of each world, summing the updates over all worlds.
+        """
+        np.dot((self.lrate * td_errors).astype(self.dtype),
+               self.state_action_eligibility.reshape(len(td_errors), -1),
+               out=self._scratch.reshape(-1))
+        self.policy += self._scratch
+
+    def decay_eligibility(self):
+        """
+        Decays the eligibility of every state action pair once.
+        """
+        self.state_action_eligibility *= self._decay
 
-    def update_state_action_eligibility(self, state_action_pair):
+    def prune_eligibility(self):
         """
-        Updates the state action eligibility given a state action pair.
+        Sets the eligibilities that have decayed below the threshold to 0,
+        keeping the table sparse and free of denormal values.
         """
-        # Calculate the new eligibility value
-        new_state_action_eligibility = (
-            self.drate * self.trace_decay *
-            self.get_state_action_eligibility(state_action_pair))
-        # Store it in the eligibility table
-        self.set_state_action_eligibility(state_action_pair,
-                                          new_state_action_eligibility)
+        self.state_action_eligibility[self.state_action_eligibility <
+                                      self.trace_threshold] = 0
 
     def get_proposed_action(self, do_argmax, state, possible_actions):
         """
-        Returns the proposed action given a state and its possible actions.
-        A parameter 'do_argmax' is also specified denoting whether the actor
-        should return the action with greatest value or a random action.
+        Returns the proposed action given a state index and its possible
+        actions. A parameter 'do_argmax' is also specified denoting whether
+        the actor should return the action with greatest value or a random
+        action.
         """
         if not do_argmax:
             # Return random action
-            return random.choice(possible_actions)
-        # Else, return the action with the best policy value
-        best_action = []
-        best_state_action_value = float('-inf')
-        for action in possible_actions:
-            state_action_pair = (*state, action)
-            state_action_value = self.get_state_action_value(state_action_pair)
-            if state_action_value > best_state_action_value:
-                best_action = [action]
-                best_state_action_value = state_action_value
-            elif best_state_action_value == state_action_value:
-                best_action.append(action)
-        return random.choice(best_action)
+            return possible_actions[random.randrange(len(possible_actions))]
+        # Else, return the action with the best policy value, breaking ties
+        # randomly.
+        if len(possible_actions) == 2:
+            # Compare the two values directly, avoiding the array reductions
+            first_value = self.policy[state, possible_actions[0]]
+            second_value = self.policy[state, possible_actions[1]]
+            if first_value == second_value:
+                return possible_actions[random.randrange(2)]
+            if first_value > second_value:
+                return possible_actions[0]
+            return possible_actions[1]
+        state_action_values = self.policy[state, possible_actions]
+        best_actions = np.flatnonzero(
+            state_action_values == state_action_values.max())
+        if len(best_actions) == 1:
+            return possible_actions[best_actions[0]]
+        return possible_actions[best_actions[random.randrange(
+            len(best_actions))]]
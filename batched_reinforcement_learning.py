@@ -0,0 +1,129 @@
+"""haakon8855"""
+
+from time import time
+import numpy as np
+
+from actor import Actor
+from critic import Critic
+from reinforcement_learning import ReinforcementLearning
+
+
+class BatchedReinforcementLearning:
+    """
+    Reinforcement learning class for training a table-based actor-critic on
+    a batch of sim worlds stepping in lockstep, e.g. GamblerBatched.
+    Each world keeps its own eligibility traces while the policy and the
+    state values are shared.
+    """
+
+    def __init__(self,
+                 sim_world,
+                 episodes,
+                 epsilon,
+                 actor_lrate,
+                 critic_lrate,
+                 trace_decay,
+                 drate,
+                 seed=None):
+        self.episodes = episodes
+        self.epsilon = epsilon
+        self.critic_lrate = critic_lrate  # alpha
+        self.drate = drate  # gamma
+        self.trace_decay = trace_decay  # lambda
+        self.sim_world = sim_world
+        # Number of steps between each pruning of the eligibilities
+        self.trace_prune_interval = 50
+
+        # Seed the RNG if seed is specified
+        if seed is not None:
+            np.random.seed(seed)
+
+        num_envs = sim_world.num_envs
+        num_states = sim_world.get_state_count()
+        num_actions = sim_world.get_action_count()
+        # The actor holds the shared policy and the eligibilities of each
+        # world.
+        self.actor = Actor(num_states,
+                           num_actions,
+                           actor_lrate,
+                           drate,
+                           trace_decay,
+                           num_envs=num_envs)
+        # Table-based critic with the same initial values as Critic
+        self.state_value = Critic.default_state_values(num_states)
+        self.critic_eligibility = np.zeros((num_envs, num_states))
+
+    def train(self):
+        """
+        Steps all sim worlds until self.episodes episodes have finished in
+        total, decreasing epsilon every 1% of the episodes.
+        """
+        start_time = time()
+        env_indexes = np.arange(self.sim_world.num_envs)
+        decay = self.drate * self.trace_decay
+        finished_episodes = 0
+        current_step = 0
+        next_epsilon_decrease = self.episodes / 100
+        states = self.sim_world.produce_initial_state()
+        while finished_episodes < self.episodes:
+            # Do actions a from states s in all worlds
+            actions = self.get_actions(states)
+            rewards, done = self.sim_world.update(actions)
+            new_states = self.sim_world.get_current_state()
+            # Set the eligibility of the former states and actions to 1
+            self.actor.replace_traces(states, actions)
+            self.critic_eligibility[env_indexes, states] = 1
+            # Calculate the TD-error of each world
+            td_errors = (rewards + self.drate * self.state_value[new_states] -
+                         self.state_value[states])
+            # Update state values and state-action values (policy) with the
+            # eligibility-weighted TD-errors summed over all worlds.
+            self.state_value += self.critic_lrate * (
+                td_errors @ self.critic_eligibility)
+            self.actor.apply_batched_td_update(td_errors)
+            # Decay the eligibilities
+            self.actor.decay_eligibility()
+            self.critic_eligibility *= decay
+            # Periodically zero out negligible eligibilities, using the
+            # actor's threshold for the critic as well.
+            current_step += 1
+            if current_step % self.trace_prune_interval == 0:
+                self.actor.prune_eligibility()
+                self.critic_eligibility[self.critic_eligibility <
+                                        self.actor.trace_threshold] = 0
+            # Reset the worlds that reached a final or failed state
+            if done.any():
+                self.actor.initiate_eligibility(done)
+                self.critic_eligibility[done] = 0
+                finished_episodes += self.sim_world.reset_done_worlds(done)
+                new_states = self.sim_world.get_current_state()
+                while finished_episodes >= next_epsilon_decrease:
+                    print("-", end="")
+                    self.epsilon = ReinforcementLearning.decayed_epsilon(
+                        self.epsilon)
+                    next_epsilon_decrease += self.episodes / 100
+            states = new_states
+        end_time = time()
+
+        print(f"Time spent training: {end_time-start_time}")
+        self.sim_world.plot_historic_game_length()
+
+    def get_actions(self, states):
+        """
+        Returns an action for each world given their states, following the
+        same epsilon-greedy strategy as ReinforcementLearning.get_action.
+        """
+        num_envs = len(states)
+        min_bet = self.sim_world.min_bet
+        max_bets = self.sim_world.max_bet_per_state[states]
+        # Random legal actions
+        random_actions = min_bet + (np.random.random(num_envs) *
+                                    (max_bets - min_bet + 1)).astype(np.int64)
+        # Actions with the best policy value, illegal actions are masked out
+        # and ties are broken randomly.
+        values = np.where(self.sim_world.legal_action_mask[states],
+                          self.actor.policy[states], -np.inf)
+        best = values == values.max(axis=1, keepdims=True)
+        greedy_actions = np.argmax(best * np.random.random(best.shape), axis=1)
+        do_random = np.random.random(num_envs) < self.epsilon
+        return np.where(do_random, random_actions, greedy_actions)
@@ -12,6 +12,9 @@ class Critic:
     on its actions.
     """
 
+    # Default state values are drawn uniformly from [0, scale)
+    default_state_value_scale = 0.5
+
     def __init__(self,
                  table_critic,
                  lrate,
@@ -57,7 +60,9 @@ class Critic:
 
     def get_td_error(self, reward, state, new_state):
         """
-        Returns the td_error given a reward, a state and the next state.
+        Returns the td_error given a reward, a state and the next state. States
+        are state indexes for the table-based critic and NN inputs for the
+        NN-based critic.
         """
         target_td = reward + self.drate * self.get_state_value(new_state)
         return target_td - self.get_state_value(state), target_td
@@ -71,18 +76,6 @@ class Critic:
             return self.state_value[state]
         return self.state_value_nn(np.array(state).reshape((1, -1)))[0, 0]
 
-    def set_state_value(self, state, value):
-        """
-        Returns the value of a given state.
-        """
-        self.state_value[state] = value
-
-    def get_state_eligibility(self, state):
-        """
-        Set the eligibility for the given state.
-        """
-        return self.state_eligibility[state]
-
     def set_state_eligibility(self, state, value):
         """
         Set the eligibility for the given state.
@@ -100,16 +93,14 @@ class Critic:
         Only for table based critic:
         Update the state evaluation given the current state and td_error.
         """
-        # Calculates the new state-value
-        new_state_value = self.get_state_value(
-            state) + self.lrate * td_error * self.get_state_eligibility(state)
-        # Stores it in the table
-        self.set_state_value(state, new_state_value)
+        self.state_value[state] += (self.lrate * td_error *
+                                    self.state_eligibility[state])
 
     def update_state_values(self, states, targets):
         """
         Only for NN based critic:
-        Update the state evaluations given a list of states and td_error.
+        Update the state evaluations given an array of NN inputs and their
+        targets.
         """
         self.state_value_nn.fit(states, targets, epochs=10, verbose=0)
 
@@ -119,9 +110,7 @@ class Critic:
         Update the state eligibility given the current state.
         """
         if self.table_critic:
-            new_state_eligibility = (self.drate * self.trace_decay *
-                                     self.get_state_eligibility(state))
-            self.set_state_eligibility(state, new_state_eligibility)
+            self.state_eligibility[state] *= self.drate * self.trace_decay
 
     @staticmethod
     def default_state_value():
@@ -129,4 +118,12 @@ class Critic:
         Returns the default value of a dictionary object that has not been
         accessed yet.
         """
-        return random() * 0.5
+        return random() * Critic.default_state_value_scale
+
+    @staticmethod
+    def default_state_values(num_states):
+        """
+        Returns an array of num_states default values, distributed like
+        default_state_value.
+        """
+        return np.random.random(num_states) * Critic.default_state_value_scale
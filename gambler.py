@@ -2,6 +2,30 @@
 
 from random import randint, random
 from matplotlib import pyplot as plt
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def _step_gamblers(states, current_step, actions, rands, win_prob, max_coins,
+                   max_steps):
+    """
+    Advances a batch of gambler worlds by one step in place given their
+    wagers and one uniform random number per world. Returns the rewards and
+    a mask of the worlds that reached a final or failed state.
+    """
+    rewards = np.empty_like(actions)
+    done = np.empty(len(states), dtype=np.bool_)
+    for i in prange(len(states)):
+        current_step[i] += 1
+        if rands[i] < win_prob:
+            rewards[i] = actions[i]  # Win money
+        else:
+            rewards[i] = -actions[i]  # Lose money
+        states[i] += rewards[i]
+        done[i] = (states[i] == 0 or states[i] == max_coins
+                   or current_step[i] >= max_steps)
+    return rewards, done
 
 
 class Gambler:
@@ -9,22 +33,29 @@ class Gambler:
     Gambler class for holding the simulated world of the gambler.
     """
 
-    def __init__(self, win_prob=0.4, max_steps=300):
-        # Constants:
-        self.max_coins = 100
-        self.min_bet = 1
+    # Constants:
+    max_coins = 100
+    min_bet = 1
 
+    def __init__(self, win_prob=0.4, max_steps=300, track_history=False):
         # State parameters:
         self.state = 0
         self.win_prob = win_prob
         self.current_step = 0
         self.max_steps = max_steps
         self.failed = False
-        self.history = []
+        # Preallocated history of the current episode, only the first
+        # history_length entries are valid. Only recorded if track_history.
+        self.track_history = track_history
+        self.history = np.empty(max_steps + 1, dtype=np.int32)
+        self.history_length = 0
         self.historic_game_length = []
         self.best_history = []
         self.best_game_length = float('inf')
         self.possible_actions = []
+        # Legal actions for each number of coins
+        (self.max_bet_per_state, self.legal_actions_per_state,
+         self.legal_action_mask) = Gambler.build_legal_action_tables()
 
         # Initialization
         self.produce_initial_state()
@@ -37,7 +68,9 @@ class Gambler:
         self.current_step = 0
         self.state = randint(1, 99)
         self.failed = False
-        self.history = [self.state]
+        if self.track_history:
+            self.history[0] = self.state
+            self.history_length = 1
         return self.get_current_state()
 
     def update(self, action: int):
@@ -55,7 +88,9 @@ class Gambler:
         self.state = self.get_child_state(action)
 
         # Cache new state for animation
-        self.history.append(self.state)
+        if self.track_history:
+            self.history[self.history_length] = self.state
+            self.history_length += 1
 
         # Check if state is failed state
         if not self.failed:
@@ -81,11 +116,10 @@ class Gambler:
 
     def get_current_state(self):
         """
-        Returns the current state of the sim world.
+        Returns the current state of the sim world, a tuple holding the
+        number of coins.
         """
-        oh_state = [0] * (self.max_coins + 1)
-        oh_state[self.state] = 1
-        return tuple(oh_state)
+        return (self.state, )
 
     def is_current_state_final_state(self):
         """
@@ -104,18 +138,14 @@ class Gambler:
 
     def get_legal_actions(self, state=None):
         """
-        Returns a list of legal actions in the current state. The action (int)
+        Returns a tuple of legal actions in the current state. The action (int)
         represents the number of coins to wager.
         """
         if state is None:
             state = self.state
         else:
-            state = state.index(1)
-        dist_to_win = self.max_coins - state  # Amount of coins needed to win
-        dist_to_lose = state  # Current amount of coins
-        max_bet = min(dist_to_lose, dist_to_win)
-        # Returns [1] if currents state is illegal state
-        return [self.min_bet] + list(range(self.min_bet + 1, max_bet + 1))
+            state = state[0]
+        return self.legal_actions_per_state[state]
 
     def action_is_legal(self, action):
         """
@@ -133,6 +163,8 @@ class Gambler:
         """
         Plots the course of the current game up until current state.
         """
+        if not self.track_history:
+            raise Exception("History tracking is disabled")
         # plt.plot(self.best_history)
         # plt.show()
 
@@ -145,19 +177,164 @@ class Gambler:
 
     def store_game_length(self):
         """
-        Stores the game length in a list to plot later.
+        Stores the game length in a list to plot later, along with the
+        history if the episode is the best so far and history is tracked.
         """
-        if self.current_step < self.best_game_length:
-            self.best_history = self.history.copy()
+        if self.track_history and self.current_step < self.best_game_length:
+            self.best_history = self.history[:self.history_length].copy()
             self.best_game_length = self.current_step
         self.historic_game_length.append(self.current_step)
 
-    def get_state_length(self):
+    def get_state_index(self, state):
         """
-        Returns the length of the one-hot encoded state representation vector.
+        Returns the integer index of the given state, i.e. the number of coins.
         """
-        return len(self.get_current_state())
+        return state[0]
+
+    def get_nn_input(self, state):
+        """
+        Returns the input of the NN-based critic for the given state, the
+        one-hot encoding of the number of coins.
+        """
+        oh_state = [0] * (self.max_coins + 1)
+        oh_state[state[0]] = 1
+        return tuple(oh_state)
+
+    def get_state_count(self):
+        """
+        Returns the number of distinct state indexes.
+        """
+        return self.max_coins + 1
+
+    def get_action_count(self):
+        """
+        Returns the number of distinct actions. Actions are used directly as
+        indexes, so this is one more than the largest possible wager.
+        """
+        return self.max_coins // 2 + 1
 
     def __str__(self):
         outstring = f"state: {self.state}"
         return outstring
+
+    @staticmethod
+    def build_legal_action_tables():
+        """
+        Returns the legal action tables of the gambler, indexed by the number
+        of coins: the largest legal wager, the tuple of legal actions and the
+        mask of legal actions of shape (number of states, number of actions).
+        """
+        # Largest legal wager for each number of coins, the distance to
+        # either 0 or max_coins coins. It is min_bet for the illegal states
+        # 0 and max_coins.
+        coins = np.arange(Gambler.max_coins + 1)
+        max_bet_per_state = np.maximum(
+            Gambler.min_bet, np.minimum(coins, Gambler.max_coins - coins))
+        legal_actions_per_state = [
+            tuple(range(Gambler.min_bet, max_bet + 1))
+            for max_bet in max_bet_per_state
+        ]
+        # Actions are used directly as indexes, up to the largest wager
+        actions = np.arange(max_bet_per_state.max() + 1)
+        legal_action_mask = ((actions >= Gambler.min_bet) &
+                             (actions <= max_bet_per_state[:, np.newaxis]))
+        return max_bet_per_state, legal_actions_per_state, legal_action_mask
+
+
+class GamblerBatched:
+    """
+    GamblerBatched class for holding a batch of simulated gambler worlds that
+    are stepped in lockstep. Worlds reaching a final or failed state are reset
+    to a new initial state by reset_done_worlds.
+    """
+
+    # Constants, the same as those of Gambler:
+    max_coins = Gambler.max_coins
+    min_bet = Gambler.min_bet
+
+    def __init__(self, num_envs=64, win_prob=0.4, max_steps=300):
+        self.num_envs = num_envs
+        self.win_prob = win_prob
+        self.max_steps = max_steps
+        self.state = None
+        self.current_step = None
+        self.historic_game_length = []
+        # Random numbers for the coin flips, one row per step and one column
+        # per world, regenerated once all rows are used.
+        self.rands = np.empty((max_steps, num_envs))
+        self.rands_row = max_steps
+        # Largest legal wager and legal action mask for each number of coins
+        self.max_bet_per_state, _, self.legal_action_mask = (
+            Gambler.build_legal_action_tables())
+
+        # Initialization
+        self.produce_initial_state()
+
+    def produce_initial_state(self):
+        """
+        Initializes all sim worlds to their initial state with a random
+        amount of coins.
+        """
+        self.state = np.random.randint(1, self.max_coins, size=self.num_envs)
+        self.current_step = np.zeros(self.num_envs, dtype=np.int64)
+        return self.get_current_state()
+
+    def update(self, actions):
+        """
+        Advances all sim worlds by one step. The actions (int array) represent
+        the amount wagered in each world. Returns the rewards and a mask of the
+        worlds that reached a final or failed state.
+        """
+        if np.any((actions < self.min_bet)
+                  | (actions > self.max_bet_per_state[self.state])):
+            raise Exception("Illegal action")
+
+        if self.rands_row == self.max_steps:
+            self.rands = np.random.random((self.max_steps, self.num_envs))
+            self.rands_row = 0
+        rands = self.rands[self.rands_row]
+        self.rands_row += 1
+
+        # Reward is amount of money earned in current step
+        return _step_gamblers(self.state, self.current_step, actions, rands,
+                              self.win_prob, self.max_coins, self.max_steps)
+
+    def reset_done_worlds(self, done):
+        """
+        Stores the game length of the worlds in the given mask and resets
+        them to their initial state. Returns the number of worlds reset.
+        """
+        num_done = np.count_nonzero(done)
+        if num_done:
+            self.historic_game_length.extend(self.current_step[done].tolist())
+            self.state[done] = np.random.randint(1,
+                                                 self.max_coins,
+                                                 size=num_done)
+            self.current_step[done] = 0
+        return num_done
+
+    def get_current_state(self):
+        """
+        Returns a copy of the current state of all sim worlds, an array
+        holding the number of coins in each.
+        """
+        return self.state.copy()
+
+    def plot_historic_game_length(self):
+        """
+        Plots the number of steps used in each historic game.
+        """
+        plt.plot(self.historic_game_length)
+        plt.show()
+
+    def get_state_count(self):
+        """
+        Returns the number of distinct state indexes.
+        """
+        return len(self.max_bet_per_state)
+
+    def get_action_count(self):
+        """
+        Returns the number of distinct actions.
+        """
+        return self.legal_action_mask.shape[1]
@@ -6,9 +6,10 @@ import numpy as np
 
 from configuration import Config
 from reinforcement_learning import ReinforcementLearning
+from batched_reinforcement_learning import BatchedReinforcementLearning
 from pole_balancing import PoleBalancing
 from hanoi import Hanoi
-from gambler import Gambler
+from gambler import Gambler, GamblerBatched
 
 
 class GPRLSystem:
@@ -31,6 +32,19 @@ class GPRLSystem:
         self.drate = float(conf_globals['drate'])
         self.verbose = conf_globals['verbose'] == 'true'
 
+        # The history of the best episode is only recorded, and plotted after
+        # training, if enabled in the config. Always recorded for hanoi.
+        self.track_history = ('track_history' in conf_globals
+                              and conf_globals['track_history'] == 'true')
+
+        # If the number of worlds is specified in the config and the critic is
+        # table-based, a batch of gambler worlds is trained in lockstep.
+        self.num_envs = None
+        if 'num_envs' in conf_globals:
+            self.num_envs = int(conf_globals['num_envs'])
+        self.batched = (self.problem == 'gambler' and self.table_critic
+                        and self.num_envs is not None)
+
         # If a seed is specified in the config, we will set the random seed
         self.seed = None
         if 'seed' in conf_globals:
@@ -52,7 +66,8 @@ class GPRLSystem:
                                            self.mass_p,
                                            self.gravity,
                                            self.tau,
-                                           max_steps=self.max_steps)
+                                           max_steps=self.max_steps,
+                                           track_history=self.track_history)
         # Fetch parameters specific to the ToH problem and create
         # an instance of the simworld.
         elif self.problem == 'hanoi':
@@ -69,14 +84,24 @@ class GPRLSystem:
         # an instance of the simworld.
         elif self.problem == 'gambler':
             win_prob = float(conf_globals['win_prob'])
-            self.sim_world = Gambler(win_prob=win_prob)
+            if self.batched:
+                self.sim_world = GamblerBatched(num_envs=self.num_envs,
+                                                win_prob=win_prob)
+            else:
+                self.sim_world = Gambler(win_prob=win_prob,
+                                         track_history=self.track_history)
 
         # Create the reinforcement learner instance, passing necessary params
-        self.reinforcement_learner = ReinforcementLearning(
-            self.sim_world, self.episodes, self.max_steps, self.table_critic,
-            self.epsilon, self.actor_lrate, self.critic_lrate,
-            self.trace_decay, self.drate, self.verbose, self.seed,
-            self.network_dimensions)
+        if self.batched:
+            self.reinforcement_learner = BatchedReinforcementLearning(
+                self.sim_world, self.episodes, self.epsilon, self.actor_lrate,
+                self.critic_lrate, self.trace_decay, self.drate, self.seed)
+        else:
+            self.reinforcement_learner = ReinforcementLearning(
+                self.sim_world, self.episodes, self.max_steps,
+                self.table_critic, self.epsilon, self.actor_lrate,
+                self.critic_lrate, self.trace_decay, self.drate, self.verbose,
+                self.seed, self.network_dimensions)
 
         # Run visualization of the gambler policy before training if current
         # run solves the gambler problem.
@@ -96,15 +121,16 @@ class GPRLSystem:
 
     def visualize_gambler_policy(self):
         """
-        Visualizes the policy for the gambler simworld.
+        Visualizes the policy for the gambler simworld, i.e. the legal wager
+        with the greatest policy value in each state.
         """
         min_state = 1
         max_state = self.sim_world.max_coins
         states_xaxis = list(range(min_state, max_state))
-        states = np.eye(max_state + 1, dtype=int)[1:-1]
-        wagers = []
-        for state in states:
-            wagers.append(self.reinforcement_learner.get_action(tuple(state)))
+        # Actions are the wagers themselves, illegal ones are masked out
+        policy = self.reinforcement_learner.actor.policy[min_state:max_state]
+        legal = self.sim_world.legal_action_mask[min_state:max_state]
+        wagers = np.where(legal, policy, -np.inf).argmax(axis=1)
         plt.plot(states_xaxis, wagers)
 
         if self.before:
@@ -22,6 +22,8 @@ class Hanoi:
         self.current_step = 0
         self.max_steps = max_steps
         self.failed = False
+        # The history is always recorded as it is needed for the animation
+        self.track_history = True
         self.history = []
         self.best_history = []
         self.best_game_length = float('inf')
@@ -197,11 +199,35 @@ class Hanoi:
             self.best_game_length = self.current_step
         self.historic_game_length.append(self.current_step)
 
-    def get_state_length(self):
+    def get_state_index(self, state):
         """
-        Returns the length of the one-hot encoded state representation vector.
+        Returns the integer index of the given one-hot encoded state, reading
+        the peg of each disc as a digit in base num_pegs.
         """
-        return self.num_pegs * self.num_discs
+        index = 0
+        for i, bit in enumerate(state):
+            if bit:
+                index = index * self.num_pegs + i % self.num_pegs
+        return index
+
+    def get_nn_input(self, state):
+        """
+        Returns the input of the NN-based critic for the given state, which
+        is the state itself, i.e. the one-hot encoded peg of each disc.
+        """
+        return state
+
+    def get_state_count(self):
+        """
+        Returns the number of distinct state indexes.
+        """
+        return self.num_pegs**self.num_discs
+
+    def get_action_count(self):
+        """
+        Returns the number of distinct actions.
+        """
+        return len(self.possible_actions)
 
     def __str__(self):
         outstring = f"state: {self.state}"
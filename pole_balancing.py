@@ -1,44 +1,82 @@
 """Haakoas"""
 
+import math
 from random import uniform
 import numpy as np
+from numba import njit
 from matplotlib import pyplot as plt
 
 
+@njit(cache=True, fastmath=True)
+def _cartpole_step(x_pos, x_vel, angle, angle_vel, bb_force, length, mass_p,
+                   mass_c, gravity, tau):
+    """
+    Returns the state after one timestep of the cart-pole physics given the
+    current state variables, the applied bang-bang-force and the constants.
+    """
+    sin_angle = math.sin(angle)
+    cos_angle = math.cos(angle)
+    total_mass = mass_p + mass_c
+    # Calculate double derivatives
+    numerator_fraction = (cos_angle *
+                          (-bb_force - mass_p * length *
+                           (angle_vel**2) * sin_angle)) / total_mass
+    numerator = gravity * sin_angle + numerator_fraction
+    denominator = length * (4 / 3 - (mass_p * (cos_angle**2)) / total_mass)
+    angle_acc = numerator / denominator
+    x_acc = (bb_force + mass_p * length *
+             ((angle_vel**2) * sin_angle - angle_acc * cos_angle)) / total_mass
+    # Calculate state variables
+    return (x_pos + tau * x_vel, x_vel + tau * x_acc, angle + tau * angle_vel,
+            angle_vel + tau * angle_acc)
+
+
 class PoleBalancing:
     """
     PoleBalancing class for holding the simulated world for balancing a pole
     on a cart.
     """
 
+    # Maximum absolute value of the rounded velocities, larger values are
+    # clamped (see round_state).
+    max_rounded_vel = 3
+
     def __init__(self,
                  length=0.5,
                  mass_p=0.1,
                  gravity=-9.8,
                  tau=0.02,
-                 max_steps=300):
+                 max_steps=300,
+                 track_history=False):
         # Constants:
         self.length = length  # m
         self.mass_p = mass_p  # kg
         self.gravity = gravity  # m/s^2
         self.tau = tau  # s, timestep length tau
-        self.mass_c = 1  # kg
-        self.force = 10  # N
+        self.mass_c = 1.0  # kg
+        self.force = 10.0  # N
+        self._forces = (-self.force, self.force)  # Indexed by action
         self.max_angle = 0.21  # radians
         self.max_x_pos = 2.4  # m
         self.steps = max_steps  # num of timesteps in episode
         # State parameters:
-        self.angle = 0
-        self.angle_vel = 0
-        self.x_pos = 0
-        self.x_vel = 0
+        self.angle = 0.0
+        self.angle_vel = 0.0
+        self.x_pos = 0.0
+        self.x_vel = 0.0
         self.current_step = 0
         self.balancing_failed = False
         self.cart_exited = False
-        self.historic_angle = []
+        # Preallocated angle history of the current episode, only the first
+        # history_length entries are valid. Only recorded if track_history.
+        self.track_history = track_history
+        self.historic_angle = np.empty(self.steps + 1, dtype=np.float32)
+        self.history_length = 0
         self.best_history = []
         self.best_game_length = float('-inf')
         self.historic_game_length = []
+        # Input of the NN-based critic for each state index, see get_nn_input
+        self.nn_inputs = PoleBalancing.build_nn_inputs()
         self.produce_initial_state()
 
     def produce_initial_state(self):
@@ -49,19 +87,21 @@ class PoleBalancing:
         between the lower and upper bound for the angle.
         """
         self.angle = uniform(-self.max_angle, self.max_angle)
-        self.angle_vel = 0
-        self.x_pos = 0
-        self.x_vel = 0
+        self.angle_vel = 0.0
+        self.x_pos = 0.0
+        self.x_vel = 0.0
         self.current_step = 0
         self.balancing_failed = False
         self.cart_exited = False
-        self.historic_angle = [self.angle]
+        if self.track_history:
+            self.historic_angle[0] = self.angle
+            self.history_length = 1
         return self.get_current_state()
 
-    def update(self, action: bool):
+    def update(self, action: int):
         """
         Advances the sim world by one timestep.
-        Parameter means to apply F if True and -F if False, i.e. either go right
+        Parameter means to apply F if 1 and -F if 0, i.e. either go right
         or go left.
         """
         self.current_step += 1
@@ -71,15 +111,17 @@ class PoleBalancing:
         self.angle = next_state[2]
         self.angle_vel = next_state[3]
 
-        self.historic_angle.append(self.angle)
+        if self.track_history:
+            self.historic_angle[self.history_length] = self.angle
+            self.history_length += 1
 
         # Update state values with the newly updated ones
         if not self.balancing_failed:
-            if np.abs(self.angle) >= self.max_angle:
+            if abs(self.angle) >= self.max_angle:
                 # If pole is outside allowed range
                 self.balancing_failed = True
         if not self.cart_exited:
-            if np.abs(self.x_pos) >= self.max_x_pos:
+            if abs(self.x_pos) >= self.max_x_pos:
                 # If cart is outside allowed range
                 self.cart_exited = True
         if self.is_current_state_failed_state():
@@ -88,52 +130,24 @@ class PoleBalancing:
         # Give positive reward if agent does not fail in current step
         return 1
 
-    def get_child_state(self, action: bool, rounded=False):
+    def get_child_state(self, action: int, rounded=False):
         """
         Returns the child state if given action is performed.
         """
         # Set the bangbang-force, either positive or negative F
-        bb_force = [-self.force, self.force][action]
-        # Calculate double derivatives
-        angle_acc = self.update_angle_acc(bb_force)
-        x_acc = self.update_x_acc(bb_force, angle_acc)
-        # Calculate state variables
-        x_pos = self.x_pos + self.tau * self.x_vel
-        x_vel = self.x_vel + self.tau * x_acc
-        angle = self.angle + self.tau * self.angle_vel
-        angle_vel = self.angle_vel + self.tau * angle_acc
+        bb_force = self._forces[action]
+        child_state = _cartpole_step(self.x_pos, self.x_vel, self.angle,
+                                     self.angle_vel, bb_force, self.length,
+                                     self.mass_p, self.mass_c, self.gravity,
+                                     self.tau)
         if rounded:
-            return PoleBalancing.round_state((x_pos, x_vel, angle, angle_vel))
-        return x_pos, x_vel, angle, angle_vel
-
-    def update_angle_acc(self, bb_force):
-        """
-        Updates the acceleration of the angle.
-        """
-        numerator_fraction = (np.cos(self.angle) *
-                              (-bb_force - self.mass_p * self.length *
-                               (self.angle_vel**2) * np.sin(self.angle))) / (
-                                   self.mass_p + self.mass_c)
-        numerator = self.gravity * np.sin(self.angle) + numerator_fraction
-        denominator = self.length * (4 / 3 - (self.mass_p *
-                                              (np.cos(self.angle)**2)) /
-                                     (self.mass_p + self.mass_c))
-        return numerator / denominator
-
-    def update_x_acc(self, bb_force, angle_acc):
-        """
-        Updates the acceleration of the cart.
-        """
-        numerator = bb_force + self.mass_p * self.length * (
-            (self.angle_vel**2) * np.sin(self.angle) -
-            angle_acc * np.cos(self.angle))
-        denominator = self.mass_p + self.mass_c
-        return numerator / denominator
+            return PoleBalancing.round_state(child_state)
+        return child_state
 
     def get_current_state(self):
         """
-        Returns the one-hot-encoded representation of the
-        current state of the sim world.
+        Returns the integer index of the rounded current state of the
+        sim world.
         """
         return PoleBalancing.round_state(
             (self.x_pos, self.x_vel, self.angle, self.angle_vel))
@@ -159,18 +173,20 @@ class PoleBalancing:
 
     def get_legal_actions(self, state=None):
         """
-        Returns the legal actions from the current state. The action (boolean)
-        represents whether the cart will be pushed to the right or not. If True
-        it will be pushed to the right, if False it will be pushed to the left.
+        Returns the legal actions from the current state. The action (int)
+        represents whether the cart will be pushed to the right or not. If 1
+        it will be pushed to the right, if 0 it will be pushed to the left.
         """
         if state is None:
             pass
-        return False, True
+        return 0, 1
 
     def plot_history_best_episode(self):
         """
         Plots the historic angle of the pole.
         """
+        if not self.track_history:
+            raise Exception("History tracking is disabled")
         plt.plot(self.best_history)
         plt.show()
 
@@ -183,18 +199,41 @@ class PoleBalancing:
 
     def store_game_length(self):
         """
-        Stores the game length in a list to plot later.
+        Stores the game length in a list to plot later, along with the angle
+        history if the episode is the best so far and history is tracked.
         """
-        if self.current_step > self.best_game_length:
-            self.best_history = self.historic_angle.copy()
+        if self.track_history and self.current_step > self.best_game_length:
+            self.best_history = (
+                self.historic_angle[:self.history_length].copy())
             self.best_game_length = self.current_step
         self.historic_game_length.append(self.current_step)
 
-    def get_state_length(self):
+    def get_state_index(self, state):
+        """
+        Returns the integer index of the given state. States are already
+        represented by their index.
+        """
+        return state
+
+    def get_nn_input(self, state):
         """
-        Returns the length of the one-hot encoded state representation vector.
+        Returns the input of the NN-based critic for the given state, the
+        concatenated one-hot encodings of each rounded state variable.
         """
-        return len(self.get_current_state())
+        return self.nn_inputs[state]
+
+    def get_state_count(self):
+        """
+        Returns the number of distinct state indexes.
+        """
+        vel_count = 2 * PoleBalancing.max_rounded_vel + 1
+        return 3 * 3 * vel_count * vel_count
+
+    def get_action_count(self):
+        """
+        Returns the number of distinct actions.
+        """
+        return 2
 
     def __str__(self):
         outstring = ""
@@ -207,37 +246,41 @@ class PoleBalancing:
     @staticmethod
     def round_state(state):
         """
-        Rounds the state variables and returns the result
+        Rounds the state variables and returns the index of the result
         state = x_pos, x_vel, angle, angle_vel
-        """
-        # Round values and one-hot-encode them
-        state_oh = PoleBalancing.one_hot_state(
-            (np.sign(state[0]), round(state[1]), np.sign(state[2]),
-             round(state[3])))
-        return tuple(state_oh)
+        The positions are reduced to their sign and the velocities are rounded
+        and clamped to [-max_rounded_vel, max_rounded_vel].
+        """
+        max_vel = PoleBalancing.max_rounded_vel
+        vel_count = 2 * max_vel + 1
+        x_pos_sign = (state[0] > 0) - (state[0] < 0)
+        angle_sign = (state[2] > 0) - (state[2] < 0)
+        x_vel = max(-max_vel, min(max_vel, round(state[1])))
+        angle_vel = max(-max_vel, min(max_vel, round(state[3])))
+        sign_index = (x_pos_sign + 1) * 3 + angle_sign + 1
+        vel_index = (x_vel + max_vel) * vel_count + angle_vel + max_vel
+        return sign_index * vel_count * vel_count + vel_index
 
     @staticmethod
-    def one_hot_state(rounded_state):
-        """
-        Returns the one-hot encoding of the state representatinon given.
-        """
-        # Get one-hot-encoded vectors for each state variable.
-        # Second parameter is maximum absolute value of that variable.
-        x_pos_oh = PoleBalancing.one_hot_variable(rounded_state[0], 1)
-        x_vel_oh = PoleBalancing.one_hot_variable(rounded_state[1], 3)
-        angle_oh = PoleBalancing.one_hot_variable(rounded_state[2], 1)
-        angle_vel_oh = PoleBalancing.one_hot_variable(rounded_state[3], 3)
-        return x_pos_oh + x_vel_oh + angle_oh + angle_vel_oh
-
-    @staticmethod
-    def one_hot_variable(rounded_var: int, abs_max: int):
-        """
-        Returns the one-hot encoding of one rounded state variable
-        """
-        vector = [0] * (abs_max * 2 + 1)
-        for i, val in enumerate(range(-abs_max, abs_max + 1)):
-            if rounded_var <= val:
-                vector[i] = 1
-                return vector
-        vector[-1] = 1
-        return vector
+    def build_nn_inputs():
+        """
+        Returns a list mapping each state index to the concatenation of the
+        one-hot encodings of its rounded state variables, ordered as
+        x_pos, x_vel, angle, angle_vel.
+        """
+        max_vel = PoleBalancing.max_rounded_vel
+        signs = range(-1, 2)
+        vels = range(-max_vel, max_vel + 1)
+        nn_inputs = {}
+        for x_pos in signs:
+            for x_vel in vels:
+                for angle in signs:
+                    for angle_vel in vels:
+                        index = PoleBalancing.round_state(
+                            (x_pos, x_vel, angle, angle_vel))
+                        nn_inputs[index] = (
+                            tuple(int(x_pos == val) for val in signs) +
+                            tuple(int(x_vel == val) for val in vels) +
+                            tuple(int(angle == val) for val in signs) +
+                            tuple(int(angle_vel == val) for val in vels))
+        return [nn_inputs[index] for index in range(len(nn_inputs))]
@@ -38,11 +38,15 @@ class ReinforcementLearning:
         self.drate = drate  # gamma
         self.trace_decay = trace_decay  # lambda
         self.verbose = verbose
+        # Number of steps between each pruning of the actor's eligibilities
+        self.trace_prune_interval = 50
         # Initialize critic, actor and sim world
         self.sim_world = sim_world
         self.critic = Critic(table_critic, critic_lrate, drate, trace_decay,
                              seed, nn_dims)
-        self.actor = Actor(actor_lrate, drate, trace_decay)
+        self.actor = Actor(sim_world.get_state_count(),
+                           sim_world.get_action_count(), actor_lrate, drate,
+                           trace_decay)
 
     def train(self):
         """
@@ -86,27 +90,37 @@ class ReinforcementLearning:
         # Set epsilon to 0 for actual gameplay without exploration
         self.epsilon = 0
         self.one_episode()
-        self.sim_world.plot_history_best_episode()
+        if self.sim_world.track_history:
+            self.sim_world.plot_history_best_episode()
 
     def decrease_epsilon(self):
         """
         Decreases epsilon.
         """
         if self.table_critic:
-            self.epsilon -= self.epsilon * 0.07
+            self.epsilon = ReinforcementLearning.decayed_epsilon(self.epsilon)
             # self.epsilon -= self.epsilon_d
 
+    @staticmethod
+    def decayed_epsilon(epsilon):
+        """
+        Returns epsilon after one decrease.
+        """
+        return epsilon - epsilon * 0.07
+
     def one_episode_nn(self):
         """
         Does one episode.
         """
-        # Init history-tracking lists
+        # Init history-tracking lists, history holds NN inputs of the states
         history = []
         target_history = []
         # Start the simworld in its initial state and get a proposed
         # action for that state.
         state = self.sim_world.produce_initial_state()
-        action = self.get_action(state)
+        state_id = self.sim_world.get_state_index(state)
+        nn_input = self.sim_world.get_nn_input(state)
+        action = self.get_action(state, state_id)
         # Reset eligibility
         self.actor.initiate_eligibility()
         # For each step of the episode:
@@ -114,50 +128,53 @@ class ReinforcementLearning:
             # Do action a from state s:
             reward = self.sim_world.update(action)
             new_state = self.sim_world.get_current_state()
+            new_state_id = self.sim_world.get_state_index(new_state)
+            new_nn_input = self.sim_world.get_nn_input(new_state)
             # Train NN if action a led to a final state
             if self.sim_world.is_current_state_final_state():
-                history.append((*new_state, 0))
-                states = np.array(history)[:, :-1]
+                history.append(new_nn_input)
+                states = np.array(history)
                 target_history.append(0)  # Important to set target to 0
                 self.critic.update_state_values(
                     states,
                     np.array(target_history).reshape(-1, 1))
                 break
-            # Append state-action-pair to history
-            history.append((*state, action))
+            # Append state to history
+            history.append(nn_input)
             # Get the agent's proposed action in the newly reached state
-            proposed_action = self.get_action(new_state)
-            # Set the eligibility for the former state and its action to 1
-            self.actor.set_state_action_eligibility((*state, action), 1)
+            proposed_action = self.get_action(new_state, new_state_id)
+            # Decay the state-action eligibilities and replace the trace of
+            # the former state and its action with 1
+            self.actor.decay_eligibility()
+            self.actor.replace_trace(
+                self.actor.get_state_action_pair(state_id, action))
             # Calculate the target value and the TD-error
             td_error, target_td = self.critic.get_td_error(
-                reward, state, new_state)
+                reward, nn_input, new_nn_input)
             # Cache the target value for training of NN after episode ends
             target_history.append(target_td)
             # Set the eligibility, doesn't really achieve anything in
             # the NN-based critic.
-            self.critic.set_state_eligibility(state, 1)
-            # Update eligibilities and state-action values for each
-            # state-action-pair so far in the episode.
-            for state_action_pair in history:
-                # Get a state and an action
-                state = state_action_pair[:-1]
-                action = state_action_pair[-1]
+            self.critic.set_state_eligibility(nn_input, 1)
+            # Update state eligibilities for each state so far in the episode.
+            for state in history:
                 # Update state eligibility
                 self.critic.update_state_eligibility(state)
-                # Update state-action value (policy)
-                self.actor.update_state_action_value(state_action_pair,
-                                                     td_error)
-                # Update state-action eligibility
-                self.actor.update_state_action_eligibility(state_action_pair)
+            # Update state-action values (policy) for all state-action-pairs
+            # at once, and periodically zero out negligible eligibilities.
+            self.actor.apply_td_update(td_error)
+            if self.sim_world.current_step % self.trace_prune_interval == 0:
+                self.actor.prune_eligibility()
             # Update the current state and action
             state = new_state
+            state_id = new_state_id
+            nn_input = new_nn_input
             action = proposed_action
             # Check if state is final or failed state
             if (self.sim_world.is_current_state_failed_state()
                     or self.sim_world.is_current_state_final_state()):
                 # Code reaches this block if timeout is reached
-                states = np.array(history)[:, :-1]
+                states = np.array(history)
                 targets = np.array(target_history).reshape(-1, 1)
                 self.critic.update_state_values(states, targets)
                 break
@@ -166,12 +183,14 @@ class ReinforcementLearning:
         """
         Does one episode.
         """
-        # Init history-tracking list
+        # Init history-tracking list of the critic's state representations
         history = []
         # Start the simworld in its initial state and get a proposed
         # action for that state.
         state = self.sim_world.produce_initial_state()
-        action = self.get_action(state)
+        state_id = self.sim_world.get_state_index(state)
+        critic_state = self.get_critic_state(state, state_id)
+        action = self.get_action(state, state_id)
         # Reset eligibility
         self.actor.initiate_eligibility()
         self.critic.initiate_eligibility()
@@ -181,45 +200,61 @@ class ReinforcementLearning:
             # Do action a from state s:
             reward = self.sim_world.update(action)
             new_state = self.sim_world.get_current_state()
-            # Store state-action-pair in history
-            history.append((*state, action))
+            new_state_id = self.sim_world.get_state_index(new_state)
+            new_critic_state = self.get_critic_state(new_state, new_state_id)
+            # Store state in history
+            history.append(critic_state)
             # Get a proposed action for the new state
-            proposed_action = self.get_action(new_state)
-            # Set the eligibility of former state and its action to 1
-            self.actor.set_state_action_eligibility((*state, action), 1)
+            proposed_action = self.get_action(new_state, new_state_id)
+            # Decay the state-action eligibilities and replace the trace of
+            # the former state and its action with 1
+            self.actor.decay_eligibility()
+            self.actor.replace_trace(
+                self.actor.get_state_action_pair(state_id, action))
             # Calculate TD-error and target-value. Latter not used in
             # table-based critic.
-            td_error, _ = self.critic.get_td_error(reward, state, new_state)
+            td_error, _ = self.critic.get_td_error(reward, critic_state,
+                                                   new_critic_state)
             # Set the critic's state eligibility to 1
-            self.critic.set_state_eligibility(state, 1)
-            # Update eligibilities and state-action values for each
-            # state-action-pair so far in the episode.
-            for state_action_pair in history:
-                # Fetch a state and action from the state-action-pair
-                state = state_action_pair[:-1]
-                action = state_action_pair[-1]
-                # Update eligibilities and values for critic and actor
+            self.critic.set_state_eligibility(critic_state, 1)
+            # Update eligibilities and state values for each state so far
+            # in the episode.
+            for state in history:
+                # Update eligibilities and values for critic
                 self.critic.update_state_value(state, td_error)
                 self.critic.update_state_eligibility(state)
-                self.actor.update_state_action_value(state_action_pair,
-                                                     td_error)
-                self.actor.update_state_action_eligibility(state_action_pair)
+            # Update state-action values (policy) for all state-action-pairs
+            # at once, and periodically zero out negligible eligibilities.
+            self.actor.apply_td_update(td_error)
+            if self.sim_world.current_step % self.trace_prune_interval == 0:
+                self.actor.prune_eligibility()
             # Update the current state and action
             state = new_state
+            state_id = new_state_id
+            critic_state = new_critic_state
             action = proposed_action
             # Check if state is final or failed state
             if (self.sim_world.is_current_state_failed_state()
                     or self.sim_world.is_current_state_final_state()):
                 end_state = True
 
-    def get_action(self, state):
+    def get_critic_state(self, state, state_id):
+        """
+        Returns the representation of a state used by the critic, its index
+        for the table-based critic and its NN input for the NN-based critic.
+        """
+        if self.table_critic:
+            return state_id
+        return self.sim_world.get_nn_input(state)
+
+    def get_action(self, state, state_id):
         """
-        Returns an action given a state by consulting the actor
+        Returns an action given a state and its index by consulting the actor
         """
         # In an epsilon-greedy strategy, do a purely random action if
         # a generated random number in the range (0, 1) is less than epsilon.
         # Otherwise pick the action that yields the greates policy value.
         do_argmax = random.random() > self.epsilon
         possible_actions = self.sim_world.get_legal_actions(state)
-        return self.actor.get_proposed_action(do_argmax, state,
+        return self.actor.get_proposed_action(do_argmax, state_id,
                                               possible_actions)